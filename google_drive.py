@@ -1,18 +1,21 @@
 import os
+import time
 import sqlite3
 import json
 import pathlib
 import logging
-from io import BytesIO
 from typing import Optional, Dict, List
 import streamlit as st
 import requests
-from google_auth_oauthlib.flow import Flow
-from google.oauth2 import id_token
-import google.auth.transport.requests
-from google.oauth2.credentials import Credentials
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
 from dotenv import load_dotenv
 
+# The Google OAuth stack (google_auth_oauthlib, google.oauth2, their
+# cryptography dependencies) costs hundreds of ms to import but is only
+# needed on actual auth/refresh paths, so it's imported lazily inside
+# the functions that use it.
+
 # Load environment variables
 load_dotenv()
 
@@ -25,6 +28,7 @@ def load_google_config():
     config = {
         "client_id": None,
         "client_secret": None,
+        "client_config": None,
         "folder_id": os.getenv("GDRIVE_FOLDER_ID"),
         "oauth_host": os.getenv("OAUTH_HELPER_HOST", "127.0.0.1"),
         "oauth_port": int(os.getenv("OAUTH_HELPER_PORT", "5001")),
@@ -38,6 +42,7 @@ def load_google_config():
         try:
             with open(client_secrets_file) as f:
                 client_secrets = json.load(f)
+                config["client_config"] = client_secrets
                 if "web" in client_secrets:
                     config["client_id"] = client_secrets["web"].get("client_id")
                     config["client_secret"] = client_secrets["web"].get("client_secret")
@@ -58,6 +63,7 @@ def load_google_config():
 # Load configuration
 GOOGLE_CONFIG = load_google_config()
 GOOGLE_CLIENT_ID = GOOGLE_CONFIG["client_id"]
+GOOGLE_CLIENT_CONFIG = GOOGLE_CONFIG["client_config"]
 GOOGLE_CLIENT_SECRET = GOOGLE_CONFIG["client_secret"]
 GDRIVE_FOLDER_ID = GOOGLE_CONFIG["folder_id"]
 OAUTH_HELPER_HOST = GOOGLE_CONFIG["oauth_host"]
@@ -69,44 +75,128 @@ DATABASE_PATH = GOOGLE_CONFIG["database_path"]
 # Force OAuthlib to allow http:// for local dev
 os.environ["OAUTHLIB_INSECURE_TRANSPORT"] = "1"
 
+# orjson is noticeably faster on the per-upload serialize/parse paths;
+# fall back to stdlib json if it isn't installed.
+try:
+    import orjson
+
+    def _json_dumps(obj) -> str:
+        return orjson.dumps(obj).decode()
+
+    def _json_loads(data):
+        return orjson.loads(data)
+except ImportError:
+    def _json_dumps(obj) -> str:
+        return json.dumps(obj)
+
+    def _json_loads(data):
+        return json.loads(data)
+
+# Shared HTTP session so googleapis.com connections are kept alive and
+# pooled across uploads/status probes instead of paying a TLS handshake
+# per request. Drive rate-limit and transient server errors are retried
+# with exponential backoff, honouring any Retry-After header.
+_SESSION = requests.Session()
+_SESSION.mount("https://", HTTPAdapter(
+    # Sized above the largest upload executor (8 workers) so parallel
+    # uploads never block waiting for a pooled connection
+    pool_connections=16,
+    pool_maxsize=16,
+    max_retries=Retry(
+        total=5,
+        status_forcelist=[429, 500, 502, 503, 504],
+        backoff_factor=0.5,
+        respect_retry_after_header=True,
+        allowed_methods=["GET", "POST", "PUT"],
+    ),
+))
+
+OAUTH_SCOPES = [
+    "https://www.googleapis.com/auth/userinfo.profile",
+    "https://www.googleapis.com/auth/userinfo.email",
+    "openid",
+    "https://www.googleapis.com/auth/drive.file",
+]
+
+# Hot-path SQL, hoisted so every call hands sqlite3 the identical string
+# object and hits its prepared-statement cache instead of re-parsing
+_SQL_SELECT_CREDS = "SELECT access_token, refresh_token, token_expiry FROM users WHERE email=?"
+_SQL_UPDATE_TOKEN = "UPDATE users SET access_token=?, token_expiry=? WHERE email=?"
+_SQL_SELECT_LATEST_EMAIL = "SELECT email FROM users ORDER BY id DESC LIMIT 1"
+_SQL_UPSERT_USER = """
+    INSERT INTO users (email, name, picture, access_token, refresh_token, token_expiry) VALUES (?, ?, ?, ?, ?, NULL)
+    ON CONFLICT(email) DO UPDATE SET
+        access_token=excluded.access_token,
+        refresh_token=COALESCE(excluded.refresh_token, users.refresh_token),
+        name=excluded.name,
+        picture=excluded.picture,
+        token_expiry=NULL
+"""
+
+@st.cache_resource
+def get_db():
+    """Shared SQLite connection reused across Streamlit reruns"""
+    conn = sqlite3.connect(
+        DATABASE_PATH, check_same_thread=False, isolation_level=None,
+        cached_statements=256,
+    )
+    conn.executescript("""
+        PRAGMA journal_mode=WAL;
+        PRAGMA synchronous=NORMAL;
+        PRAGMA temp_store=MEMORY;
+        PRAGMA cache_size=-20000;
+        PRAGMA busy_timeout=5000;
+    """)
+    return conn
+
+# The schema can't change at runtime, so DDL only needs to run once per process
+_DB_INITED = False
+
 def init_db():
     """Initialize SQLite database for storing user credentials"""
-    conn = sqlite3.connect(DATABASE_PATH)
-    c = conn.cursor()
-    c.execute("""
+    global _DB_INITED
+    if _DB_INITED:
+        return
+    conn = get_db()
+    conn.execute("""
         CREATE TABLE IF NOT EXISTS users (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             email TEXT UNIQUE,
             name TEXT,
             picture TEXT,
             access_token TEXT,
-            refresh_token TEXT
+            refresh_token TEXT,
+            token_expiry REAL
         )
     """)
-    conn.commit()
-    conn.close()
+    # Older databases predate the token_expiry column
+    try:
+        conn.execute("ALTER TABLE users ADD COLUMN token_expiry REAL")
+    except sqlite3.OperationalError:
+        pass
+    # email is UNIQUE in the table definition, but databases created before
+    # that constraint existed need the index added explicitly so lookups and
+    # the ON CONFLICT(email) upserts stay O(log n)
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_users_email ON users(email)")
+    _DB_INITED = True
 
 def get_oauth_flow():
     """Create Google OAuth flow"""
-    client_secrets_file = os.path.join(pathlib.Path(__file__).parent, "client_secret.json")
-    
-    if not os.path.exists(client_secrets_file):
+    if not GOOGLE_CLIENT_CONFIG:
         st.error("client_secret.json file not found. Please ensure it's in the same directory as this app.")
         return None
-    
+
     if not GOOGLE_CLIENT_ID:
         st.error("Google Client ID not found. Please check your client_secret.json file or environment variables.")
         return None
-    
+
     try:
-        flow = Flow.from_client_secrets_file(
-            client_secrets_file=client_secrets_file,
-            scopes=[
-                "https://www.googleapis.com/auth/userinfo.profile",
-                "https://www.googleapis.com/auth/userinfo.email",
-                "openid",
-                "https://www.googleapis.com/auth/drive.file",
-            ],
+        from google_auth_oauthlib.flow import Flow
+
+        # Build from the config parsed once at import — no per-call disk read
+        flow = Flow.from_client_config(
+            GOOGLE_CLIENT_CONFIG,
+            scopes=OAUTH_SCOPES,
             redirect_uri=f"http://{STREAMLIT_HOST}:{STREAMLIT_PORT}/callback"
         )
         return flow
@@ -114,18 +204,28 @@ def get_oauth_flow():
         st.error(f"Error creating OAuth flow: {e}")
         return None
 
-def get_valid_credentials(email: str) -> Optional[Credentials]:
+# Credentials stay valid for an hour, so there is no point re-reading the
+# database and rebuilding the object on every rerun. Entries map email to
+# (creds, monotonic deadline); the deadline stays a minute short of the
+# token's real expiry so refreshes still happen proactively.
+_CRED_CACHE: Dict[str, tuple] = {}
+_CRED_CACHE_TTL = 55 * 60
+
+def get_valid_credentials(email: str) -> Optional["Credentials"]:
     """Get valid credentials for a user, refreshing if necessary"""
-    conn = sqlite3.connect(DATABASE_PATH)
-    c = conn.cursor()
-    c.execute("SELECT access_token, refresh_token FROM users WHERE email=?", (email,))
-    row = c.fetchone()
-    conn.close()
+    import google.auth.transport.requests
+    from google.oauth2.credentials import Credentials
+
+    cached = _CRED_CACHE.get(email)
+    if cached and time.monotonic() < cached[1]:
+        return cached[0]
+
+    row = get_db().execute(_SQL_SELECT_CREDS, (email,)).fetchone()
 
     if not row:
         return None
 
-    access_token, refresh_token = row
+    access_token, refresh_token, token_expiry = row
 
     try:
         # Build credentials object
@@ -137,106 +237,182 @@ def get_valid_credentials(email: str) -> Optional[Credentials]:
             client_secret=GOOGLE_CLIENT_SECRET
         )
 
-        # Refresh if needed
-        if creds.expired and creds.refresh_token:
+        # Refresh proactively when the stored expiry is unknown or less
+        # than a minute away, so Drive calls never hit a mid-batch 401
+        needs_refresh = token_expiry is None or token_expiry - time.time() < 60
+        if (needs_refresh or creds.expired) and creds.refresh_token:
             request_session = google.auth.transport.requests.Request()
             creds.refresh(request_session)
 
-            # Save new token
-            conn = sqlite3.connect(DATABASE_PATH)
-            c = conn.cursor()
-            c.execute("UPDATE users SET access_token=? WHERE email=?", (creds.token, email))
-            conn.commit()
-            conn.close()
+            # Save new token and its expiry
+            expiry_ts = creds.expiry.timestamp() if creds.expiry else None
+            get_db().execute(_SQL_UPDATE_TOKEN, (creds.token, expiry_ts, email))
+            token_expiry = expiry_ts
+
+        # Cache until shortly before the token expires (capped at the TTL)
+        deadline = time.monotonic() + _CRED_CACHE_TTL
+        if token_expiry is not None:
+            deadline = min(deadline, time.monotonic() + (token_expiry - time.time()) - 60)
+        _CRED_CACHE[email] = (creds, deadline)
 
         return creds
     except Exception as e:
         logging.error(f"Error getting credentials: {e}")
         return None
 
-def upload_image_to_drive(image_bytes: bytes, filename: str, user_email: str) -> Dict:
-    """Upload image bytes to Google Drive"""
+# Images above this size go through the resumable endpoint in 256 KB
+# chunks so memory stays bounded and transient failures retry per chunk.
+RESUMABLE_THRESHOLD = 5 * 1024 * 1024
+UPLOAD_CHUNK_SIZE = 256 * 1024
+
+# Constant multipart/related framing, encoded once; only the per-file
+# metadata JSON varies, so a retried request reuses the same body with
+# no re-serialization.
+_MULTIPART_BOUNDARY = "posterflow_upload_boundary"
+_MULTIPART_META_HEAD = f"--{_MULTIPART_BOUNDARY}\r\nContent-Type: application/json; charset=UTF-8\r\n\r\n".encode("ascii")
+_MULTIPART_MEDIA_HEAD = f"\r\n--{_MULTIPART_BOUNDARY}\r\nContent-Type: image/png\r\n\r\n".encode("ascii")
+_MULTIPART_TAIL = f"\r\n--{_MULTIPART_BOUNDARY}--".encode("ascii")
+_MULTIPART_CONTENT_TYPE = f"multipart/related; boundary={_MULTIPART_BOUNDARY}"
+
+def _upload_resumable(image_bytes: bytes, filename: str, headers: Dict) -> Dict:
+    """Upload via Drive's resumable protocol, streaming fixed-size chunks"""
+    metadata = {"name": filename, "parents": [GDRIVE_FOLDER_ID]}
+    init_headers = dict(headers)
+    init_headers["Content-Type"] = "application/json; charset=UTF-8"
+    init_headers["X-Upload-Content-Type"] = "image/png"
+    init_url = "https://www.googleapis.com/upload/drive/v3/files?uploadType=resumable"
+    init_resp = _SESSION.post(init_url, headers=init_headers, data=_json_dumps(metadata))
+    if not init_resp.ok:
+        return {"success": False, "error": f"Resumable init failed: {init_resp.status_code} {init_resp.reason}: {init_resp.text[:512]}"}
+
+    session_uri = init_resp.headers["Location"]
+    total = len(image_bytes)
+    view = memoryview(image_bytes)
+    response = None
+    for start in range(0, total, UPLOAD_CHUNK_SIZE):
+        end = min(start + UPLOAD_CHUNK_SIZE, total)
+        chunk_headers = {
+            "Content-Length": str(end - start),
+            "Content-Range": f"bytes {start}-{end - 1}/{total}",
+        }
+        response = _SESSION.put(session_uri, headers=chunk_headers, data=view[start:end])
+        if response.status_code not in (200, 201, 308):
+            return {"success": False, "error": f"Chunk upload failed: {response.status_code} {response.reason}: {response.text[:512]}"}
+
+    if response is not None and response.status_code in (200, 201):
+        return {
+            "success": True,
+            "file_id": _json_loads(response.content).get("id"),
+            "message": f"File '{filename}' uploaded successfully!"
+        }
+    return {"success": False, "error": "Resumable upload did not complete"}
+
+def upload_image_to_drive(image_bytes: bytes, filename: str, creds: "Credentials") -> Dict:
+    """Upload image bytes to Google Drive using already-fetched credentials
+
+    Callers uploading several files should call get_valid_credentials once
+    and reuse the result, rather than paying a DB read per file. Callers
+    are also expected to have verified GDRIVE_FOLDER_ID is configured
+    before starting a batch — the UIs check it once up front.
+    """
     try:
-        if not GDRIVE_FOLDER_ID:
-            return {"success": False, "error": "Google Drive folder ID not configured. Please set GDRIVE_FOLDER_ID in .env file."}
-        
-        creds = get_valid_credentials(user_email)
         if not creds:
             return {"success": False, "error": "No valid credentials found"}
 
         headers = {"Authorization": f"Bearer {creds.token}"}
+
+        # Large payloads stream through the resumable endpoint in chunks
+        if len(image_bytes) > RESUMABLE_THRESHOLD:
+            return _upload_resumable(image_bytes, filename, headers)
+
         metadata = {
             "name": filename,
             "parents": [GDRIVE_FOLDER_ID]
         }
-        
-        # Create file-like object from bytes
-        files = {
-            "data": ("metadata", json.dumps(metadata), "application/json; charset=UTF-8"),
-            "file": (filename, BytesIO(image_bytes), "image/png")
-        }
+
+        # Drive's multipart endpoint expects multipart/related, which
+        # requests' files= form encoding doesn't produce. Join the
+        # pre-encoded framing around the existing bytes (bytes or
+        # memoryview both work) — no BytesIO wrapper and no re-encode
+        # pass through the form encoder.
+        body = b"".join([
+            _MULTIPART_META_HEAD,
+            _json_dumps(metadata).encode("utf-8"),
+            _MULTIPART_MEDIA_HEAD,
+            image_bytes,
+            _MULTIPART_TAIL,
+        ])
+        post_headers = dict(headers)
+        post_headers["Content-Type"] = _MULTIPART_CONTENT_TYPE
 
         upload_url = "https://www.googleapis.com/upload/drive/v3/files?uploadType=multipart"
-        response = requests.post(upload_url, headers=headers, files=files)
+        response = _SESSION.post(upload_url, headers=post_headers, data=body)
 
-        if response.status_code == 200:
-            file_id = response.json().get("id")
+        if response.ok:
+            file_id = _json_loads(response.content).get("id")
             return {
-                "success": True, 
+                "success": True,
                 "file_id": file_id,
                 "message": f"File '{filename}' uploaded successfully!"
             }
         else:
+            # Bound the error slice so a large failure payload isn't
+            # fully decoded just for the message
             return {
-                "success": False, 
-                "error": f"Upload failed: {response.text}"
+                "success": False,
+                "error": f"Upload failed: {response.status_code} {response.reason}: {response.text[:512]}"
             }
     except Exception as e:
         return {"success": False, "error": str(e)}
 
 def get_authenticated_user() -> Optional[str]:
     """Get the email of the authenticated user"""
-    conn = sqlite3.connect(DATABASE_PATH)
-    c = conn.cursor()
-    c.execute("SELECT email FROM users ORDER BY id DESC LIMIT 1")
-    row = c.fetchone()
-    conn.close()
+    row = get_db().execute(_SQL_SELECT_LATEST_EMAIL).fetchone()
     return row[0] if row else None
 
 def debug_show_users():
     """Debug function to show all users in database"""
     try:
-        conn = sqlite3.connect(DATABASE_PATH)
-        c = conn.cursor()
-        c.execute("SELECT id, email, name, access_token IS NOT NULL as has_token, refresh_token IS NOT NULL as has_refresh FROM users")
-        rows = c.fetchall()
-        conn.close()
-        return rows
+        return get_db().execute(
+            "SELECT id, email, name, access_token IS NOT NULL as has_token, refresh_token IS NOT NULL as has_refresh FROM users LIMIT 100"
+        ).fetchall()
     except Exception as e:
         logging.error(f"Error getting users: {e}")
         return []
 
+# (timestamp, result) of the last helper probe; the helper is local, so
+# a short timeout plus a few seconds of caching keeps the UI responsive
+# even when it's down.
+_HELPER_STATUS_TTL = 5.0
+_helper_status_cache = (0.0, False)
+
+def clear_users():
+    """Delete all users on the shared connection"""
+    get_db().execute("DELETE FROM users")
+    _CRED_CACHE.clear()
+
 def check_oauth_helper_status() -> bool:
-    """Check if OAuth helper is running"""
+    """Check if OAuth helper is running (cached for a few seconds)"""
+    global _helper_status_cache
+    ts, ok = _helper_status_cache
+    if time.monotonic() - ts < _HELPER_STATUS_TTL:
+        return ok
     try:
-        response = requests.get(f"http://{OAUTH_HELPER_HOST}:{OAUTH_HELPER_PORT}/status", timeout=2)
-        return response.status_code == 200
+        response = _SESSION.get(f"http://{OAUTH_HELPER_HOST}:{OAUTH_HELPER_PORT}/status", timeout=0.25)
+        ok = response.status_code == 200
     except:
-        return False
+        ok = False
+    _helper_status_cache = (time.monotonic(), ok)
+    return ok
 
 def save_manual_tokens(email: str, access_token: str, refresh_token: Optional[str] = None):
     """Save manually entered tokens to database"""
     try:
-        conn = sqlite3.connect(DATABASE_PATH)
-        c = conn.cursor()
-        c.execute("""
-            INSERT OR IGNORE INTO users (email, name, picture, access_token, refresh_token) VALUES (?, ?, ?, ?, ?)
-        """, (email, email.split('@')[0], "", access_token, refresh_token))
-        c.execute("""
-            UPDATE users SET access_token=?, refresh_token=? WHERE email=?
-        """, (access_token, refresh_token, email))
-        conn.commit()
-        conn.close()
+        # A manually pasted token has no known expiry; the upsert resets
+        # token_expiry to NULL so get_valid_credentials refreshes
+        # proactively on first use
+        get_db().execute(_SQL_UPSERT_USER, (email, email.split('@')[0], "", access_token, refresh_token))
+        _CRED_CACHE.pop(email, None)
         logging.info(f"Tokens saved for user: {email}")
     except Exception as e:
         logging.error(f"Error saving tokens: {e}")
@@ -244,9 +420,11 @@ def save_manual_tokens(email: str, access_token: str, refresh_token: Optional[st
 def display_gdrive_upload_ui(images: List[Dict]):
     """Display Google Drive upload UI in Streamlit"""
     st.subheader("🔗 Upload to Google Drive")
-    
-    # Initialize database
-    init_db()
+
+    # Initialize database (once per session, not per rerun)
+    if "db_inited" not in st.session_state:
+        init_db()
+        st.session_state["db_inited"] = True
     
     # Check configuration
     if not GDRIVE_FOLDER_ID:
@@ -257,8 +435,13 @@ def display_gdrive_upload_ui(images: List[Dict]):
         st.error("❌ Google Client ID not found. Please check your client_secret.json file.")
         return
     
-    # Check if user is authenticated
-    user_email = get_authenticated_user()
+    # Check if user is authenticated — session state first so reruns
+    # skip the SQLite read entirely once a user is known
+    user_email = st.session_state.get("user_email")
+    if not user_email:
+        user_email = get_authenticated_user()
+        if user_email:
+            st.session_state["user_email"] = user_email
     
     if not user_email:
         st.info("You need to authenticate with Google to upload images to Drive.")
@@ -302,15 +485,21 @@ def display_gdrive_upload_ui(images: List[Dict]):
     else:
         st.success(f"✅ Authenticated as: {user_email}")
         
-        # Show debug info
+        # Show debug info — Streamlit evaluates expander bodies even when
+        # collapsed, so gate the query behind an explicit toggle
         with st.expander("🔍 Debug Info"):
-            users = debug_show_users()
-            if users:
-                st.write("Users in database:")
-                for user in users:
-                    st.write(f"- ID: {user[0]}, Email: {user[1]}, Name: {user[2]}, Has Token: {user[3]}, Has Refresh: {user[4]}")
-            else:
-                st.write("No users found in database")
+            if st.checkbox("Show debug info", key="show_debug"):
+                users = debug_show_users()
+                if users:
+                    st.write("Users in database:")
+                    # One table render instead of a widget per row
+                    st.dataframe(
+                        users,
+                        column_config={i: col for i, col in enumerate(
+                            ["ID", "Email", "Name", "Has Token", "Has Refresh"])}
+                    )
+                else:
+                    st.write("No users found in database")
             
             # Show configuration
             st.write("Configuration:")
@@ -323,52 +512,55 @@ def display_gdrive_upload_ui(images: List[Dict]):
         with col1:
             if st.button("🔄 Logout"):
                 # Clear user from database
-                conn = sqlite3.connect(DATABASE_PATH)
-                c = conn.cursor()
-                c.execute("DELETE FROM users WHERE email=?", (user_email,))
-                conn.commit()
-                conn.close()
+                get_db().execute("DELETE FROM users WHERE email=?", (user_email,))
+                st.session_state.pop("user_email", None)
                 st.rerun()
-        
+
         with col2:
             if st.button("🧹 Clear All Users"):
-                conn = sqlite3.connect(DATABASE_PATH)
-                c = conn.cursor()
-                c.execute("DELETE FROM users")
-                conn.commit()
-                conn.close()
+                clear_users()
+                st.session_state.pop("user_email", None)
                 st.success("All users cleared!")
                 st.rerun()
         
-        # Upload section
-        st.write("Select images to upload:")
-        upload_selected = []
-        
-        for i, item in enumerate(images):
-            if st.checkbox(f"Upload {item['name']}", key=f"upload_{i}"):
-                upload_selected.append(i)
+        # Upload section — one multiselect widget instead of N checkboxes,
+        # so widget state stays O(1) as the image list grows
+        upload_selected = st.multiselect(
+            "Select images to upload:",
+            options=range(len(images)),
+            format_func=lambda i: images[i]["name"],
+            key="upload_select"
+        )
         
         if upload_selected and st.button("📤 Upload Selected to Drive"):
+            from concurrent.futures import ThreadPoolExecutor, as_completed
             progress_bar = st.progress(0)
             status_text = st.empty()
-            
-            for i, idx in enumerate(upload_selected):
-                item = images[idx]
-                status_text.text(f"Uploading {item['name']}...")
-                progress_bar.progress((i) / len(upload_selected))
-                
-                result = upload_image_to_drive(item["bytes"], item["name"], user_email)
-                
-                if result["success"]:
-                    st.success(result["message"])
-                else:
-                    st.error(f"Failed to upload {item['name']}: {result['error']}")
-            
-            progress_bar.progress(1.0)
-            status_text.text("Upload complete!")
-            
-            # Clean up progress indicators after a moment
-            import time
-            time.sleep(2)
+            status_text.text(f"Uploading {len(upload_selected)} image(s)...")
+
+            # Fetch credentials once for the whole batch
+            creds = get_valid_credentials(user_email)
+
+            # Per-file uploads are independent HTTPS requests; six workers
+            # overlap the round-trips without tripping Drive rate limits.
+            done = 0
+            with ThreadPoolExecutor(max_workers=6) as ex:
+                futures = {
+                    ex.submit(upload_image_to_drive, images[idx]["bytes"], images[idx]["name"], creds): idx
+                    for idx in upload_selected
+                }
+                for fut in as_completed(futures):
+                    item = images[futures[fut]]
+                    result = fut.result()
+                    done += 1
+                    progress_bar.progress(done / len(upload_selected))
+
+                    if result["success"]:
+                        st.success(result["message"])
+                    else:
+                        st.error(f"Failed to upload {item['name']}: {result['error']}")
+
+            # Replace the progress indicators with the final status; no
+            # blocking sleep — the rerun happens as soon as the user acts
             progress_bar.empty()
-            status_text.empty()
+            status_text.text("Upload complete!")
@@ -16,18 +16,23 @@ import os
 import sqlite3
 import json
 import pathlib
+import hashlib
 import logging
+import string
+import threading
+import time
 from flask import Flask, request, redirect, jsonify
 from google_auth_oauthlib.flow import Flow
 import google.auth.transport.requests
 import requests
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
-# Configure logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s: %(message)s')
+# Configure logging — WARNING by default; LOG_LEVEL=INFO restores the chatter
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "WARNING"), format='%(asctime)s %(levelname)s: %(message)s')
 
 app = Flask(__name__)
 app.secret_key = os.getenv("FLASK_SECRET_KEY", "oauth_helper_secret")
@@ -35,6 +40,22 @@ app.secret_key = os.getenv("FLASK_SECRET_KEY", "oauth_helper_secret")
 # Force OAuthlib to allow http:// for local dev
 os.environ["OAUTHLIB_INSECURE_TRANSPORT"] = "1"
 
+# orjson parses a few times faster than stdlib json; fall back silently
+# when it isn't installed (same pattern as google_drive.py)
+# Pooled session for calls to googleapis.com so repeat logins reuse the
+# TLS connection instead of handshaking every time
+_HTTP = requests.Session()
+_HTTP.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=4))
+
+try:
+    import orjson
+
+    def _json_loads(data):
+        return orjson.loads(data)
+except ImportError:
+    def _json_loads(data):
+        return json.loads(data)
+
 # Load Google OAuth configuration from client_secret.json and environment
 def load_google_config():
     """Load Google OAuth configuration from client_secret.json and environment variables"""
@@ -44,6 +65,7 @@ def load_google_config():
     config = {
         "client_id": None,
         "client_secret": None,
+        "client_config": None,
         "oauth_host": os.getenv("OAUTH_HELPER_HOST", "127.0.0.1"),
         "oauth_port": int(os.getenv("OAUTH_HELPER_PORT", "5001")),
         "streamlit_host": os.getenv("STREAMLIT_HOST", "127.0.0.1"),
@@ -56,6 +78,9 @@ def load_google_config():
         try:
             with open(client_secrets_file) as f:
                 client_secrets = json.load(f)
+                # Keep the whole parsed document so the flow can be built
+                # from it without re-reading the file per request
+                config["client_config"] = client_secrets
                 if "web" in client_secrets:
                     config["client_id"] = client_secrets["web"].get("client_id")
                     config["client_secret"] = client_secrets["web"].get("client_secret")
@@ -77,46 +102,107 @@ def load_google_config():
 GOOGLE_CONFIG = load_google_config()
 GOOGLE_CLIENT_ID = GOOGLE_CONFIG["client_id"]
 GOOGLE_CLIENT_SECRET = GOOGLE_CONFIG["client_secret"]
+GOOGLE_CLIENT_CONFIG = GOOGLE_CONFIG["client_config"]
 OAUTH_HELPER_HOST = GOOGLE_CONFIG["oauth_host"]
 OAUTH_HELPER_PORT = GOOGLE_CONFIG["oauth_port"]
 STREAMLIT_HOST = GOOGLE_CONFIG["streamlit_host"]
 STREAMLIT_PORT = GOOGLE_CONFIG["streamlit_port"]
 DATABASE_PATH = GOOGLE_CONFIG["database_path"]
 
+# One connection for the whole process — opening a fresh connection per request
+# re-parses the schema and re-negotiates the journal mode every time. Flask's
+# dev server and waitress both run handlers on worker threads, so access is
+# serialized through _DB_LOCK.
+_DB_CONN = None
+_DB_LOCK = threading.Lock()
+
+# Hot-path SQL hoisted to constants so sqlite3's prepared-statement cache
+# gets the identical string object on every call
+_SQL_UPSERT_USER = """
+    INSERT INTO users (email, name, picture, access_token, refresh_token, token_expiry) VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT(email) DO UPDATE SET
+        access_token=excluded.access_token,
+        refresh_token=COALESCE(excluded.refresh_token, users.refresh_token),
+        name=excluded.name,
+        picture=excluded.picture,
+        token_expiry=excluded.token_expiry
+"""
+# MAX(rowid) is answered straight off the B-tree's right edge — no scan
+# and no sorter, however large the table grows
+_SQL_SELECT_LATEST = "SELECT email, name FROM users WHERE id = (SELECT MAX(id) FROM users)"
+
+def _get_conn():
+    """Return the shared SQLite connection, creating it on first use."""
+    global _DB_CONN
+    if _DB_CONN is None:
+        conn = sqlite3.connect(
+            DATABASE_PATH, check_same_thread=False, isolation_level=None,
+            cached_statements=256,
+        )
+        # Applied once here rather than per request: WAL +
+        # synchronous=NORMAL drops the rollback journal's double fsync
+        # from the /callback commit path and lets /status read while a
+        # callback is writing
+        conn.executescript("""
+            PRAGMA journal_mode=WAL;
+            PRAGMA synchronous=NORMAL;
+            PRAGMA temp_store=MEMORY;
+            PRAGMA mmap_size=134217728;
+            PRAGMA cache_size=-8000;
+            PRAGMA busy_timeout=5000;
+        """)
+        _DB_CONN = conn
+    return _DB_CONN
+
+# DDL only needs to run once per process; the flag lives under _DB_LOCK so
+# concurrent first requests under a threaded server can't race it
+_initialized = False
+
 def init_db():
     """Initialize SQLite database for storing user credentials"""
-    conn = sqlite3.connect(DATABASE_PATH)
-    c = conn.cursor()
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            email TEXT UNIQUE,
-            name TEXT,
-            picture TEXT,
-            access_token TEXT,
-            refresh_token TEXT
-        )
-    """)
-    conn.commit()
-    conn.close()
+    global _initialized
+    with _DB_LOCK:
+        if _initialized:
+            return
+        _get_conn().execute("""
+            CREATE TABLE IF NOT EXISTS users (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                email TEXT UNIQUE,
+                name TEXT,
+                picture TEXT,
+                access_token TEXT,
+                refresh_token TEXT,
+                token_expiry REAL
+            )
+        """)
+        # Older databases predate the token_expiry column
+        try:
+            _get_conn().execute("ALTER TABLE users ADD COLUMN token_expiry REAL")
+        except sqlite3.OperationalError:
+            pass
+        _initialized = True
+
+# Run at import so WSGI deployments (where __main__ never executes) still
+# get the schema without handlers having to call init_db themselves
+init_db()
+
+OAUTH_SCOPES = [
+    "https://www.googleapis.com/auth/userinfo.profile",
+    "https://www.googleapis.com/auth/userinfo.email",
+    "openid",
+    "https://www.googleapis.com/auth/drive.file",
+]
 
 def get_oauth_flow():
-    """Create Google OAuth flow"""
-    client_secrets_file = os.path.join(pathlib.Path(__file__).parent, "client_secret.json")
-    
-    if not os.path.exists(client_secrets_file):
+    """Create Google OAuth flow from the config parsed at import time"""
+    if not GOOGLE_CLIENT_CONFIG:
         logging.error("client_secret.json file not found")
         return None
-    
+
     try:
-        flow = Flow.from_client_secrets_file(
-            client_secrets_file=client_secrets_file,
-            scopes=[
-                "https://www.googleapis.com/auth/userinfo.profile",
-                "https://www.googleapis.com/auth/userinfo.email",
-                "openid",
-                "https://www.googleapis.com/auth/drive.file",
-            ],
+        flow = Flow.from_client_config(
+            GOOGLE_CLIENT_CONFIG,
+            scopes=OAUTH_SCOPES,
             redirect_uri=f"http://{OAUTH_HELPER_HOST}:{OAUTH_HELPER_PORT}/callback"
         )
         return flow
@@ -124,14 +210,46 @@ def get_oauth_flow():
         logging.error(f"Error creating OAuth flow: {e}")
         return None
 
-@app.route("/")
-def index():
-    return f"""
+# The index page only depends on import-time config, so build it (and its
+# ETag) once; repeat visits get a 304 instead of the body
+_INDEX_HTML = f"""
     <h2>OAuth Helper for Streamlit Google Drive</h2>
     <p>This service handles OAuth callbacks for your Streamlit app.</p>
     <p>Status: Running on {OAUTH_HELPER_HOST}:{OAUTH_HELPER_PORT}</p>
     <p><a href="/start_oauth">Start OAuth Flow</a></p>
     """
+_INDEX_ETAG = hashlib.md5(_INDEX_HTML.encode("utf-8")).hexdigest()
+
+@app.route("/")
+def index():
+    if request.if_none_match.contains(_INDEX_ETAG):
+        return "", 304
+    resp = app.make_response(_INDEX_HTML)
+    resp.set_etag(_INDEX_ETAG)
+    resp.headers["Cache-Control"] = "public, max-age=60"
+    return resp
+
+# Pending OAuth states, kept in memory instead of a file on disk — two
+# writes plus a read and an unlink per login, and a file that a second
+# concurrent login would clobber. States expire after ten minutes.
+_STATES = {}
+_STATES_LOCK = threading.Lock()
+_STATE_TTL = 600
+
+def _remember_state(state):
+    now = time.time()
+    with _STATES_LOCK:
+        # Drop expired states while we're here so the dict can't grow
+        for old, ts in list(_STATES.items()):
+            if now - ts > _STATE_TTL:
+                del _STATES[old]
+        _STATES[state] = now
+
+def _consume_state(state):
+    """Pop the state if it is known and unexpired; return whether it was."""
+    with _STATES_LOCK:
+        ts = _STATES.pop(state, None)
+    return ts is not None and time.time() - ts <= _STATE_TTL
 
 @app.route("/start_oauth")
 def start_oauth():
@@ -139,36 +257,78 @@ def start_oauth():
     flow = get_oauth_flow()
     if not flow:
         return "Error: Could not create OAuth flow", 500
-    
+
     authorization_url, state = flow.authorization_url(
         access_type="offline",
         include_granted_scopes="true",
         prompt="consent"
     )
-    
-    # Store state in a simple way (in production, use proper session management)
-    with open("oauth_state.txt", "w") as f:
-        f.write(state)
-    
+
+    _remember_state(state)
+
     return redirect(authorization_url)
 
+# Success page prepared once at import; only the user's name and the
+# Streamlit URL vary per login, so the callback just substitutes two
+# placeholders instead of rebuilding (and brace-escaping) the whole page
+_SUCCESS_TMPL = string.Template("""
+<html>
+<head>
+    <title>Authentication Successful</title>
+    <meta http-equiv="refresh" content="3;url=$streamlit_url">
+    <style>
+        body { font-family: Arial, sans-serif; margin: 40px; text-align: center; background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); color: white; }
+        .container { background: rgba(255, 255, 255, 0.1); padding: 30px; border-radius: 15px; box-shadow: 0 8px 32px 0 rgba(31, 38, 135, 0.37); backdrop-filter: blur(4px); border: 1px solid rgba(255, 255, 255, 0.18); }
+        .success { color: #4CAF50; font-size: 24px; margin-bottom: 20px; }
+        .countdown { color: #f0f0f0; font-size: 16px; margin: 20px 0; }
+        .spinner { border: 4px solid rgba(255, 255, 255, 0.3); border-top: 4px solid #4CAF50; border-radius: 50%; width: 40px; height: 40px; animation: spin 1s linear infinite; margin: 20px auto; }
+        @keyframes spin { 0% { transform: rotate(0deg); } 100% { transform: rotate(360deg); } }
+        .link { color: #90CAF9; text-decoration: none; }
+        .link:hover { color: #BBDEFB; }
+    </style>
+</head>
+<body>
+    <div class="container">
+        <div class="success">✅ Authentication Successful!</div>
+        <h3>Welcome, <strong>$name</strong>!</h3>
+        <p>Your Google Drive access has been configured successfully.</p>
+        <p>You can now save your generated images directly to Google Drive!</p>
+
+        <div class="spinner"></div>
+        <p class="countdown">Redirecting to Streamlit app in <span id="countdown">3</span> seconds...</p>
+        <p><a href="$streamlit_url" class="link">Click here if not redirected automatically</a></p>
+        <button onclick="window.close()" style="margin-top: 10px; padding: 8px 16px; background: #4CAF50; color: white; border: none; border-radius: 5px; cursor: pointer;">Close This Window</button>
+    </div>
+
+    <script>
+        var timeLeft = 3;
+        var timer = setInterval(function() {
+            timeLeft--;
+            document.getElementById('countdown').textContent = timeLeft;
+            if (timeLeft <= 0) {
+                clearInterval(timer);
+                window.location.href = '$streamlit_url';
+            }
+        }, 1000);
+    </script>
+</body>
+</html>
+""")
+
 @app.route("/callback")
 def callback():
     """Handle OAuth callback"""
     try:
-        # Read stored state
-        try:
-            with open("oauth_state.txt", "r") as f:
-                stored_state = f.read().strip()
-        except FileNotFoundError:
-            stored_state = None
-        
-        # Get state from request
+        # Nothing to exchange without an authorization code — short-circuit
+        # before any state lookup or token work
+        if "code" not in request.args:
+            return "Missing authorization code", 400
+
+        # Validate the state against the in-memory store
         request_state = request.args.get("state")
-        
-        if stored_state and stored_state != request_state:
+        if request_state and not _consume_state(request_state):
             return "State mismatch error", 400
-        
+
         # Exchange code for tokens
         flow = get_oauth_flow()
         if not flow:
@@ -177,113 +337,67 @@ def callback():
         flow.fetch_token(authorization_response=request.url)
         credentials = flow.credentials
         
-        # Get user info
-        user_info_url = f"https://www.googleapis.com/oauth2/v2/userinfo?access_token={credentials.token}"
-        response = requests.get(user_info_url)
+        # Get user info — token goes in the Authorization header, not the
+        # query string, so it never lands in server or proxy access logs
+        response = _HTTP.get(
+            "https://www.googleapis.com/oauth2/v2/userinfo",
+            headers={"Authorization": f"Bearer {credentials.token}"},
+            timeout=5,
+        )
         if response.status_code != 200:
             return f"Failed to get user info: {response.text}", 400
         
-        id_info = response.json()
+        id_info = _json_loads(response.content)
         
-        # Save to database
-        init_db()
-        conn = sqlite3.connect(DATABASE_PATH)
-        c = conn.cursor()
-        c.execute("""
-            INSERT OR IGNORE INTO users (email, name, picture, access_token, refresh_token) VALUES (?, ?, ?, ?, ?)
-        """, (
-            id_info["email"],
-            id_info.get("name", id_info["email"].split('@')[0]),
-            id_info.get("picture", ""),
-            credentials.token,
-            getattr(credentials, "refresh_token", None)
-        ))
-        c.execute("""
-            UPDATE users SET access_token=?, refresh_token=?, name=?, picture=? WHERE email=?
-        """, (
-            credentials.token,
-            getattr(credentials, "refresh_token", None),
-            id_info.get("name", id_info["email"].split('@')[0]),
-            id_info.get("picture", ""),
-            id_info["email"]
-        ))
-        conn.commit()
-        conn.close()
-        
-        # Clean up state file
-        try:
-            os.remove("oauth_state.txt")
-        except FileNotFoundError:
-            pass
-        
-        logging.info(f"OAuth successful for user: {id_info['email']}")
-        
-        return f"""
-        <html>
-        <head>
-            <title>Authentication Successful</title>
-            <meta http-equiv="refresh" content="3;url=http://{STREAMLIT_HOST}:{STREAMLIT_PORT}">
-            <style>
-                body {{ font-family: Arial, sans-serif; margin: 40px; text-align: center; background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); color: white; }}
-                .container {{ background: rgba(255, 255, 255, 0.1); padding: 30px; border-radius: 15px; box-shadow: 0 8px 32px 0 rgba(31, 38, 135, 0.37); backdrop-filter: blur(4px); border: 1px solid rgba(255, 255, 255, 0.18); }}
-                .success {{ color: #4CAF50; font-size: 24px; margin-bottom: 20px; }}
-                .countdown {{ color: #f0f0f0; font-size: 16px; margin: 20px 0; }}
-                .spinner {{ border: 4px solid rgba(255, 255, 255, 0.3); border-top: 4px solid #4CAF50; border-radius: 50%; width: 40px; height: 40px; animation: spin 1s linear infinite; margin: 20px auto; }}
-                @keyframes spin {{ 0% {{ transform: rotate(0deg); }} 100% {{ transform: rotate(360deg); }} }}
-                .link {{ color: #90CAF9; text-decoration: none; }}
-                .link:hover {{ color: #BBDEFB; }}
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <div class="success">✅ Authentication Successful!</div>
-                <h3>Welcome, <strong>{id_info.get('name', id_info['email'])}</strong>!</h3>
-                <p>Your Google Drive access has been configured successfully.</p>
-                <p>You can now save your generated images directly to Google Drive!</p>
-                
-                <div class="spinner"></div>
-                <p class="countdown">Redirecting to Streamlit app in <span id="countdown">3</span> seconds...</p>
-                <p><a href="http://{STREAMLIT_HOST}:{STREAMLIT_PORT}" class="link">Click here if not redirected automatically</a></p>
-                <button onclick="window.close()" style="margin-top: 10px; padding: 8px 16px; background: #4CAF50; color: white; border: none; border-radius: 5px; cursor: pointer;">Close This Window</button>
-            </div>
-            
-            <script>
-                var timeLeft = 3;
-                var timer = setInterval(function() {{
-                    timeLeft--;
-                    document.getElementById('countdown').textContent = timeLeft;
-                    if (timeLeft <= 0) {{
-                        clearInterval(timer);
-                        window.location.href = 'http://localhost:8501';
-                    }}
-                }}, 1000);
-            </script>
-        </body>
-        </html>
-        """
+        # Bind the user fields once instead of re-deriving them per column
+        email = id_info["email"]
+        name = id_info.get("name") or email.split('@', 1)[0]
+        picture = id_info.get("picture", "")
+        refresh_token = getattr(credentials, "refresh_token", None)
+        # Persist the expiry so the Streamlit side can refresh proactively
+        # instead of discovering a dead token mid-upload
+        token_expiry = credentials.expiry.timestamp() if credentials.expiry else None
+
+        # Save to database — single atomic UPSERT instead of INSERT-then-UPDATE;
+        # COALESCE keeps the stored refresh_token when Google omits it on re-login.
+        with _DB_LOCK:
+            _get_conn().execute(_SQL_UPSERT_USER, (email, name, picture, credentials.token, refresh_token, token_expiry))
         
+        logging.info(f"OAuth successful for user: {email}")
+
+        return _SUCCESS_TMPL.substitute(name=name, streamlit_url=f"http://{STREAMLIT_HOST}:{STREAMLIT_PORT}")
+
     except Exception as e:
         logging.error(f"OAuth callback error: {e}")
         return f"Authentication failed: {str(e)}", 500
 
+# Serialized once; the unauthenticated answer never varies, and the
+# Streamlit side polls /status frequently
+_STATUS_UNAUTHENTICATED = '{"authenticated": false}'
+
+@app.route("/health")
+def health():
+    """Liveness probe — no DB touch, just proof the server is accepting requests"""
+    return "ok"
+
 @app.route("/status")
 def status():
     """Check authentication status"""
     try:
-        conn = sqlite3.connect("users.db")
-        c = conn.cursor()
-        c.execute("SELECT email, name FROM users ORDER BY id DESC LIMIT 1")
-        row = c.fetchone()
-        conn.close()
-        
+        with _DB_LOCK:
+            row = _get_conn().execute(_SQL_SELECT_LATEST).fetchone()
+
         if row:
-            return jsonify({
+            resp = jsonify({
                 "authenticated": True,
                 "email": row[0],
                 "name": row[1]
             })
         else:
-            return jsonify({"authenticated": False})
+            resp = app.response_class(_STATUS_UNAUTHENTICATED, mimetype="application/json")
+        # Auth state must never be served stale from a cache
+        resp.headers["Cache-Control"] = "no-store"
+        return resp
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -291,11 +405,8 @@ def status():
 def clear_users():
     """Clear all users (for testing)"""
     try:
-        conn = sqlite3.connect(DATABASE_PATH)
-        c = conn.cursor()
-        c.execute("DELETE FROM users")
-        conn.commit()
-        conn.close()
+        with _DB_LOCK:
+            _get_conn().execute("DELETE FROM users")
         return "All users cleared successfully"
     except Exception as e:
         return f"Error clearing users: {e}", 500
@@ -318,4 +429,19 @@ if __name__ == "__main__":
     print(f"   - Database: {DATABASE_PATH}")
     print(f"   - Google Client ID: {GOOGLE_CLIENT_ID[:20]}..." if GOOGLE_CLIENT_ID else "   - Google Client ID: Not configured")
     print("")
-    app.run(host=OAUTH_HELPER_HOST, port=OAUTH_HELPER_PORT, debug=True)
+    try:
+        # Waitress is a production WSGI server: threaded, no reloader
+        # subprocess, and much lower per-request overhead than Flask's
+        # development server
+        from waitress import serve
+        serve(app, host=OAUTH_HELPER_HOST, port=OAUTH_HELPER_PORT)
+    except ImportError:
+        # Debug mode (and its reloader, which doubles the process) is
+        # opt-in via OAUTH_HELPER_DEBUG=1 rather than always on
+        app.run(
+            host=OAUTH_HELPER_HOST,
+            port=OAUTH_HELPER_PORT,
+            debug=os.getenv("OAUTH_HELPER_DEBUG", "0") == "1",
+            use_reloader=False,
+            threaded=True,
+        )
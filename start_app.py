@@ -5,8 +5,28 @@ import subprocess
 import sys
 import time
 import os
+import urllib.request
 from pathlib import Path
 
+def wait_for_oauth_helper(port, timeout=15.0):
+    """Poll the helper's /health endpoint until it answers or timeout passes
+
+    Returns True as soon as the server accepts a request, so startup costs
+    ~100 ms on a fast machine instead of a fixed 2-second sleep, and slow
+    machines aren't raced past the helper coming up.
+    """
+    deadline = time.monotonic() + timeout
+    url = f"http://127.0.0.1:{port}/health"
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=1) as resp:
+                if resp.status == 200:
+                    return True
+        except OSError:
+            pass
+        time.sleep(0.1)
+    return False
+
 def main():
     print("🚀 Starting PosterFlow with Google Drive Integration")
     print("=" * 50)
@@ -23,14 +43,16 @@ def main():
     
     try:
         # Start OAuth helper in background
-        print("1. Starting OAuth Helper on port 5001...")
+        oauth_port = os.getenv("OAUTH_HELPER_PORT", "5001")
+        print(f"1. Starting OAuth Helper on port {oauth_port}...")
         oauth_process = subprocess.Popen([
             str(python_exe), "oauth_helper.py"
         ], cwd=current_dir)
-        
-        # Give OAuth helper time to start
-        time.sleep(2)
-        
+
+        # Wait until the helper actually answers instead of a blind sleep
+        if not wait_for_oauth_helper(oauth_port):
+            print("⚠️  OAuth Helper didn't respond yet - continuing anyway")
+
         # Start Streamlit app
         print("2. Starting Streamlit app on port 8501...")
         streamlit_process = subprocess.Popen([